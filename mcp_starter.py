@@ -7,20 +7,25 @@ logging.basicConfig(
 
 
 import asyncio
-from typing import Annotated
+import hashlib
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Annotated
 import os
+import threading
 from dotenv import load_dotenv
 from fastmcp import FastMCP
-from fastmcp.server.auth.providers.bearer import BearerAuthProvider, RSAKeyPair
+from fastmcp.server.auth.providers.bearer import BearerAuthProvider
 from mcp import ErrorData, McpError
 from mcp.server.auth.provider import AccessToken
 from mcp.types import TextContent, INVALID_PARAMS, INTERNAL_ERROR
 from pydantic import BaseModel, Field
 
-import markdownify
 import httpx
-import readabilipy
-import json
+import orjson
+
+if TYPE_CHECKING:
+    import numpy as np
 
 # --- Load environment variables ---
 load_dotenv()
@@ -33,11 +38,48 @@ assert TOKEN, "Please set AUTH_TOKEN in your .env file"
 assert MY_NUMBER, "Please set MY_NUMBER in your .env file"
 assert OPENROUTER_API_KEY, "Please set OPENROUTER_API_KEY in your .env file"
 
+# --- Shared HTTP clients (reused so Keep-Alive pools connections) ---
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+OPENROUTER_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=HTTP_LIMITS,
+    timeout=30.0,
+    headers={
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    },
+)
+
+# Caps in-flight OpenRouter requests to stay under the plan's rate limit
+OPENROUTER_CONCURRENCY = asyncio.Semaphore(16)
+
+# Separate client for arbitrary URLs so the OpenRouter key is never sent to them.
+# Its cookie jar accepts nothing, so cookies set by one fetched site (or by
+# DuckDuckGo) never leak into later, unrelated tool calls.
+HTTP_CLIENT = httpx.AsyncClient(
+    limits=HTTP_LIMITS,
+    timeout=30.0,
+    cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+)
+
 # --- Auth Provider ---
+# BearerAuthProvider requires a public key, but load_access_token below only
+# compares the literal token, so the key is never used. A fixed key (its private
+# half was discarded) avoids generating a fresh RSA keypair on every startup.
+STATIC_PUBLIC_KEY = """-----BEGIN PUBLIC KEY-----
+MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEA2Ms8+oYerDFjcGlDJHh/
++NxTEUwxt8QKT+jj47+yWVlZxyCE2i7xKJk7H7Xvs611Nez1qXiCOmtwnLTr3tt1
+SaKWurjCPKTAsH21vfdl1AIBNn3Vwzi0YxIw9ZEdyLDDD/BKabPqJK6/NhwEB2jH
+PsuZU8V6P6Jl+hzGRZ9UVcbJrmh17wZa8O3kbPOY3MjMELc5F2Tf7mMLEttAVemU
+sPh+p5HDrjlnHAbg/3rkl16VkMCgppwjEr/9SyTzgsqWGyJVV5VTAbxNVeTQSZ5c
+y0LuJ1yJNIjkf3Y7GZcFOkbHrVF7YCzmjPh9lNfza5NohmwffVL6f913H6NWbME4
+8QIDAQAB
+-----END PUBLIC KEY-----"""
+
 class SimpleBearerAuthProvider(BearerAuthProvider):
     def __init__(self, token: str):
-        k = RSAKeyPair.generate()
-        super().__init__(public_key=k.public_key, jwks_uri=None, issuer=None, audience=None)
+        super().__init__(public_key=STATIC_PUBLIC_KEY, jwks_uri=None, issuer=None, audience=None)
         self.token = token
 
     async def load_access_token(self, token: str) -> AccessToken | None:
@@ -57,39 +99,40 @@ class Fetch:
 
     @classmethod
     async def fetch_url(cls, url: str, user_agent: str, force_raw: bool = False) -> tuple[str, str]:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, follow_redirects=True, headers={"User-Agent": user_agent}, timeout=30)
-            except httpx.HTTPError as e:
-                raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url}: {e!r}"))
+        try:
+            response = await HTTP_CLIENT.get(url, follow_redirects=True, headers={"User-Agent": user_agent}, timeout=30)
+        except httpx.HTTPError as e:
+            raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url}: {e!r}"))
 
-            if response.status_code >= 400:
-                raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url} - status code {response.status_code}"))
+        if response.status_code >= 400:
+            raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url} - status code {response.status_code}"))
 
-            page_raw = response.text
+        page_raw = response.text
 
         content_type = response.headers.get("content-type", "")
         is_page_html = "text/html" in content_type
 
         if is_page_html and not force_raw:
-            return cls.extract_content_from_html(page_raw), ""
+            return await cls.extract_content_from_html(page_raw), ""
         return (page_raw, f"Content type {content_type} cannot be simplified to markdown, but here is the raw content:\n")
 
     @staticmethod
-    def extract_content_from_html(html: str) -> str:
-        ret = readabilipy.simple_json.simple_json_from_html_string(html, use_readability=True)
+    async def extract_content_from_html(html: str) -> str:
+        import markdownify
+        import readabilipy.simple_json
+        # Both calls are CPU-bound (readability also spawns node), so keep them off the event loop
+        ret = await asyncio.to_thread(readabilipy.simple_json.simple_json_from_html_string, html, use_readability=True)
         if not ret or not ret.get("content"):
             return "<error>Page failed to be simplified from HTML</error>"
-        return markdownify.markdownify(ret["content"], heading_style=markdownify.ATX)
+        return await asyncio.to_thread(markdownify.markdownify, ret["content"], heading_style=markdownify.ATX)
 
     @staticmethod
     async def google_search_links(query: str, num_results: int = 5) -> list[str]:
         ddg_url = f"https://html.duckduckgo.com/html/?q={query.replace(' ', '+')}"
         links = []
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(ddg_url, headers={"User-Agent": Fetch.USER_AGENT})
-            if resp.status_code != 200:
-                return ["<error>Failed to perform search.</error>"]
+        resp = await HTTP_CLIENT.get(ddg_url, headers={"User-Agent": Fetch.USER_AGENT})
+        if resp.status_code != 200:
+            return ["<error>Failed to perform search.</error>"]
 
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(resp.text, "html.parser")
@@ -101,6 +144,101 @@ class Fetch:
                 break
         return links or ["<error>No results found.</error>"]
 
+# --- Semantic Response Cache ---
+class SemanticCache:
+    """LRU cache of tool responses keyed on the embedding of the input text."""
+
+    MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._model = None
+        self._model_lock = threading.Lock()
+        # Unit-vector embeddings in fixed slots; allocated on the first set once the dimension is known
+        self._matrix: "np.ndarray | None" = None
+        self._last_used: "np.ndarray | None" = None
+        self._responses: list[list[TextContent] | None] = [None] * max_entries
+        self._size = 0
+        self._clock = 0
+
+    def load_model(self) -> None:
+        # Serialized so concurrent callers never download or initialize the model twice
+        with self._model_lock:
+            if self._model is None:
+                from fastembed import TextEmbedding
+                self._model = TextEmbedding(self.MODEL_NAME)
+
+    async def warm_up(self) -> None:
+        try:
+            await asyncio.to_thread(self.load_model)
+            logging.info("semantic cache model loaded")
+        except Exception:
+            logging.exception("semantic cache model failed to load; semantic caching disabled")
+
+    def _embed_sync(self, text: str) -> "np.ndarray":
+        import numpy as np
+        vec = next(iter(self._model.embed([text])))
+        # Store unit vectors so cosine similarity is a plain dot product
+        return vec / np.linalg.norm(vec)
+
+    def _touch(self, slot: int) -> None:
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    async def lookup(self, text: str, threshold: float = 0.92) -> "tuple[list[TextContent] | None, np.ndarray | None]":
+        """Return (cached response or None, query embedding to pass to set on a miss)."""
+        # The cache is only an optimization: while the model is still loading (or
+        # failed to load) and on any error, report a miss instead of failing the tool
+        if self._model is None:
+            return None, None
+        try:
+            q = await asyncio.to_thread(self._embed_sync, text)
+            if not self._size:
+                return None, q
+            scores = self._matrix[:self._size] @ q
+            best = int(scores.argmax())
+            if scores[best] < threshold:
+                return None, q
+            self._touch(best)
+            return self._responses[best], q
+        except Exception:
+            logging.exception("semantic cache lookup failed; treating as a miss")
+            return None, None
+
+    def set(self, vec: "np.ndarray | None", response: list[TextContent]) -> None:
+        if vec is None:
+            return
+        try:
+            import numpy as np
+            if self._matrix is None:
+                self._matrix = np.empty((self.max_entries, vec.shape[0]), dtype=vec.dtype)
+                self._last_used = np.zeros(self.max_entries, dtype=np.int64)
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Full: overwrite the least recently used slot in place
+                slot = int(self._last_used.argmin())
+            self._matrix[slot] = vec
+            self._responses[slot] = response
+            self._touch(slot)
+        except Exception:
+            logging.exception("semantic cache store failed")
+
+CACHE = SemanticCache()
+
+# --- Exact-match Response Cache (checked before the semantic cache) ---
+_EXACT_CACHE: "OrderedDict[str, list[TextContent]]" = OrderedDict()
+_EXACT_CACHE_MAX = 2048
+
+def exact_cache_key(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def exact_cache_put(key: str, response: list[TextContent]) -> None:
+    _EXACT_CACHE[key] = response
+    if len(_EXACT_CACHE) > _EXACT_CACHE_MAX:
+        _EXACT_CACHE.popitem(last=False)
+
 # --- MCP Server Setup ---
 mcp = FastMCP("Job Finder MCP Server", auth=SimpleBearerAuthProvider(TOKEN))
 
@@ -115,40 +253,90 @@ TECH_TRANSLATOR_DESCRIPTION = RichToolDescription(
     use_when="Use this when the user provides any term, phrase, or sentence they want explained clearly.",
 )
 
+SYSTEM_MSG = {"role": "system", "content": "You are a tech explainer. For any input, output four sections:\n1. 📖 Plain English:\n2. 🔹 TL;DR:\n3. 🍼 ELI5:\n4. 📊 Visual (text diagram)."}
+
+# The payload is identical on every call except for the user message, so the
+# fixed part is serialized once. Dropping the closing "]}" leaves the messages
+# array open for the user message to be appended per request.
+_PAYLOAD_PREFIX = orjson.dumps({
+    "model": "openai/gpt-oss-20b:free",
+    "temperature": 0.7,
+    "stream": True,
+    "messages": [SYSTEM_MSG],
+})[:-2] + b',{"role":"user","content":'
+_PAYLOAD_SUFFIX = b"}]}"
+
+def build_payload(tech_text: str) -> bytes:
+    return _PAYLOAD_PREFIX + orjson.dumps(tech_text) + _PAYLOAD_SUFFIX
+
+# The prefix slicing relies on "messages" being the last key; catch a reordered dict at import
+assert orjson.loads(build_payload("x"))["messages"][-1] == {"role": "user", "content": "x"}, \
+    "_PAYLOAD_PREFIX must end inside the messages array"
+
 @mcp.tool(description=TECH_TRANSLATOR_DESCRIPTION.model_dump_json())
 async def tech_translator(
     tech_text: Annotated[str, Field(description="Any term, phrase, or sentence to explain")]
 ) -> list[TextContent]:
     try:
         logging.info(f"tech_translator input: {tech_text}")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        key = exact_cache_key(tech_text)
+        if key in _EXACT_CACHE:
+            logging.info("tech_translator exact cache hit")
+            _EXACT_CACHE.move_to_end(key)
+            return _EXACT_CACHE[key]
+
+        cached, query_vec = await CACHE.lookup(tech_text)
+        if cached is not None:
+            logging.info("tech_translator semantic cache hit")
+            exact_cache_put(key, cached)
+            return cached
+
+        pieces: list[str] = []
+        done = False
+        finish_reason = None
+        async with OPENROUTER_CONCURRENCY:
+            async with OPENROUTER_CLIENT.stream(
+                "POST",
                 "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                data=json.dumps({
-                    "model": "openai/gpt-oss-20b:free",
-                    "messages": [
-                        {"role": "system", "content": "You are a tech explainer. For any input, output four sections:\n1. 📖 Plain English:\n2. 🔹 TL;DR:\n3. 🍼 ELI5:\n4. 📊 Visual (text diagram)."},
-                        {"role": "user", "content": tech_text}
-                    ],
-                    "temperature": 0.7
-                })
-            )
-
-        if response.status_code != 200:
-            raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"OpenRouter API error: {response.text}"))
-
-        api_data = response.json()
-        explanation = api_data["choices"][0]["message"]["content"]
-        
-        logging.info(f"tech_translator output: {explanation}")
-        return [TextContent(type="text", text=explanation)]
+                content=build_payload(tech_text),
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"OpenRouter API error: {response.text}"))
 
+                async for line in response.aiter_lines():
+                    # Skips blank event separators and ": OPENROUTER PROCESSING" keep-alives
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        done = True
+                        break
+                    chunk = orjson.loads(data)
+                    if "error" in chunk:
+                        raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"OpenRouter API error: {chunk['error']}"))
+                    # The trailing usage event arrives with an empty choices list
+                    for choice in chunk.get("choices") or []:
+                        delta = choice.get("delta") or {}
+                        if delta.get("content"):
+                            pieces.append(delta["content"])
+                        if choice.get("finish_reason"):
+                            finish_reason = choice["finish_reason"]
 
-        return [TextContent(type="text", text=explanation)]
+        explanation = "".join(pieces)
+        # A cut-off stream, a "length"/"error" finish, or a reply spent entirely on
+        # reasoning must not be returned (or cached) as if it were a full answer
+        if not done or finish_reason not in (None, "stop") or not explanation:
+            raise McpError(ErrorData(
+                code=INTERNAL_ERROR,
+                message=f"OpenRouter returned an incomplete response (finish_reason={finish_reason!r}, completed={done})",
+            ))
+        
+        logging.info(f"tech_translator output: {explanation}")
+        texts = [TextContent(type="text", text=explanation)]
+        exact_cache_put(key, texts)
+        CACHE.set(query_vec, texts)
+        return texts
 
     except Exception as e:
         raise McpError(ErrorData(code=INTERNAL_ERROR, message=str(e)))
@@ -156,7 +344,14 @@ async def tech_translator(
 # --- Run MCP Server ---
 async def main():
     print("🚀 Starting MCP server on http://0.0.0.0:8086")
-    await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    # Load the embedding model in the background so startup and early requests don't wait on it
+    warm_up = asyncio.create_task(CACHE.warm_up())
+    try:
+        await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    finally:
+        warm_up.cancel()
+        await OPENROUTER_CLIENT.aclose()
+        await HTTP_CLIENT.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())